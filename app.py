@@ -1,28 +1,52 @@
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 import os
+import sys
 import logging
 import requests
 import json
-import openmeteo_requests
-import requests_cache
 import re
+import random
+import hashlib
+import math
 import asyncio
 import urllib.request
 import json
-from datetime import datetime, timedelta
-from retry_requests import retry
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+import sqlite3
+import gzip
+import signal
+import threading
+import traceback
+import multiprocessing
+import queue
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from collections import OrderedDict, Counter, defaultdict, deque
+from datetime import datetime, timedelta, timezone
+from telegram import (
+    Bot,
+    Update,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InlineQueryResultArticle,
+    InputTextMessageContent,
+)
+from telegram.error import BadRequest
 from telegram.ext import (
     Application,
     CommandHandler,
     CallbackQueryHandler,
+    InlineQueryHandler,
     MessageHandler,
+    TypeHandler,
     filters,
     CallbackContext,
     ContextTypes,
     ConversationHandler,
 )
 from dotenv import load_dotenv
-from typing import Tuple, Optional, Dict, Any, List
+from typing import Tuple, Optional, Dict, Any, List, Sequence
 
 # Load environment variables
 load_dotenv()
@@ -43,30 +67,487 @@ CONFIG = {
     "OPENROUTER_API_KEY": os.getenv("OPENROUTER_API_KEY"),
     "TELEGRAM_TOKEN": os.getenv("TELEGRAM_TOKEN"),
     "WEATHER_API_CACHE_EXPIRE": 1800,  # 30 minutes
+    "AI_CACHE_EXPIRE": 3600,  # 1 hour
+    "NEWS_CACHE_EXPIRE": 900,  # 15 minutes
+    "STALE_MAX_AGE": 6 * 3600,  # how long past expiry cached data may still be served as a fallback
+    "SHARED_CACHE_BUSY_TIMEOUT": 0.1,  # seconds a shared cache call may wait on another worker's write
+    "UPDATE_DEADLINE": float(os.getenv("UPDATE_DEADLINE", "6")),  # seconds per update, from handler entry
+    # Speculative prefetching of the likely next menu result
+    "PREFETCH_MAX_CONCURRENT": 2,
+    "PREFETCH_PER_MINUTE": 20,  # upstream calls per minute, across all users and workers
+    "PREFETCH_SIBLINGS": 2,  # other prep guides warmed when the disaster menu is likely next
+    "PREFETCH_DEADLINE": 20,
+    # Hedged weather requests across providers
+    "HEDGE_PERCENTILE": 90,  # send a second request once the first is slower than this percentile
+    "HEDGE_DEFAULT_DELAY": 1.5,  # seconds, until enough latency samples exist
+    "HEDGE_MIN_SAMPLES": 10,
     "MAX_CITY_LENGTH": 50,
     "MAX_QUESTION_LENGTH": 200,
+    # ask_ai conversation context
+    "AI_HISTORY_TURNS": 6,  # Q&A turns kept per user
+    "AI_HISTORY_ANSWER_CHARS": 400,  # stored length of each past answer
+    "AI_PROMPT_BUDGET": 2000,  # max characters sent to the model, system message included
+    "MESSAGE_LIMIT": 4096,  # Telegram's limit, in UTF-16 code units
+    "INLINE_CACHE_TIME": 300,  # seconds Telegram may cache inline answers
+    "INLINE_EMPTY_CACHE_TIME": 5,  # for empty or stale answers, so failed lookups are retried
+    "INLINE_DEBOUNCE": 0.6,  # seconds to wait for the user to stop typing
+    "INLINE_MIN_QUERY": 3,
+    "INLINE_MAX_RESULTS": 5,
+    "INLINE_WARM_CITIES": ["Manila", "Quezon City", "Cebu City", "Davao City", "Baguio"],
+    "INLINE_WARM_INTERVAL": 1500,  # seconds between re-warms, inside WEATHER_API_CACHE_EXPIRE
+    # Multi-process deployment: a webhook receiver feeding WORKERS processes
+    "WORKERS": int(os.getenv("WORKERS", "1")),
+    "WEBHOOK_URL": os.getenv("WEBHOOK_URL"),
+    "WEBHOOK_LISTEN": os.getenv("WEBHOOK_LISTEN", "0.0.0.0"),
+    "WEBHOOK_PORT": int(os.getenv("WEBHOOK_PORT", "8443")),
+    "WEBHOOK_SECRET": os.getenv("WEBHOOK_SECRET"),
+    "CACHE_SNAPSHOT_PATH": os.getenv("CACHE_SNAPSHOT_PATH", ".cache_snapshot.json.gz"),
+    "SHUTDOWN_GRACE": 10,  # seconds to let background work finish on shutdown
+    "ADMIN_IDS": {int(uid) for uid in os.getenv("ADMIN_IDS", "").split(",") if uid.strip()},
+    # requests_cache store (.cache.sqlite) limits and upkeep
+    "HTTP_CACHE_NAME": ".cache",  # requests_cache adds the .sqlite suffix
+    "HTTP_CACHE_MAX_BYTES": int(os.getenv("HTTP_CACHE_MAX_BYTES", str(50 * 1024 * 1024))),
+    "HTTP_CACHE_MAINTENANCE_INTERVAL": 600,  # seconds between expiry sweeps
+    "HTTP_CACHE_VACUUM_EVERY": 6,  # sweeps between VACUUMs
+    # Event loop monitoring
+    "WATCHDOG_INTERVAL": 0.1,  # seconds between heartbeats
+    "STALL_THRESHOLD": float(os.getenv("STALL_THRESHOLD", "0.5")),  # seconds the loop may block
+    "PROFILE_DIR": "profiles",
+    "PROFILE_MAX_SECONDS": 60,
+    "PROFILE_SAMPLE_INTERVAL": 0.005,
+    # Per-user and per-chat data limits
+    "USER_IDLE_TTL": int(os.getenv("USER_IDLE_TTL", str(24 * 3600))),  # seconds before idle data is dropped
+    "USER_DATA_MAX": int(os.getenv("USER_DATA_MAX", "10000")),  # users (and chats) kept in memory
+    "SWEEP_INTERVAL": 300,
+    "SWEEP_MEMORY_SAMPLE": 200,  # users (and chats) sized per sweep to estimate memory use
 }
+# Caches shared between worker processes live in SQLite; a single process keeps them in memory
+CONFIG["SHARED_CACHE_PATH"] = os.getenv("SHARED_CACHE_PATH") or (
+    ".shared_cache.sqlite" if CONFIG["WORKERS"] > 1 else None
+)
 
 # States for conversation handler
 MAIN_MENU, WEATHER_LOCATION, ASK_QUESTION, EVENTS_LOCATION, WATER_TIPS_LOCATION = range(5)
 
-# Open-Meteo client
-# Setup cached session
-cache_session = requests_cache.CachedSession(
-    '.cache',
-    expire_after=CONFIG["WEATHER_API_CACHE_EXPIRE"],
-    backend='sqlite'
-)
+# Background tasks that are not tied to a single update
+_background_tasks = set()
+# Inline queries whose expired answer is being refreshed, and the common-city re-warm loop
+_inline_refreshing: set = set()
+_weather_warmer: Optional[asyncio.Task] = None
+
+# Cached HTTP session for Open-Meteo
+# Built on first use: requests_cache (and openmeteo_requests, with numpy) are slow to
+# import and open the .cache SQLite file, which most requests never need
+_cache_session = None
+_cache_session_lock = threading.Lock()  # first use may come from several worker threads
+
+def get_cache_session():
+    """Return the cached HTTP session, creating it on first use"""
+    global _cache_session
+    with _cache_session_lock:
+        if _cache_session is None:
+            import requests_cache
+
+            session = requests_cache.CachedSession(
+                CONFIG["HTTP_CACHE_NAME"],
+                expire_after=CONFIG["WEATHER_API_CACHE_EXPIRE"],
+                backend='sqlite',
+                wal=True
+            )
+            http_cache_maintainer.init_access_table(session)
+            session.hooks['response'].append(http_cache_maintainer.record_access)
+            _cache_session = session
+    return _cache_session
+
+# HTTP cache maintenance
+class HttpCacheMaintainer:
+    """Keeps the requests_cache SQLite store bounded: expiry sweeps, LRU eviction, VACUUM.
+
+    Last access times live in a table next to the responses, so with several worker
+    processes the one running maintenance sees every worker's cache hits.
+    """
+
+    ACCESS_TABLE = "http_cache_access"
+
+    def __init__(self, max_bytes: int, interval: float, vacuum_every: int):
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.vacuum_every = vacuum_every
+        self._task: Optional[asyncio.Task] = None
+        self.metrics = {
+            "runs": 0,
+            "size_bytes": 0,
+            "entries": 0,
+            "expired_removed": 0,
+            "evicted": 0,
+            "vacuums": 0,
+            "last_run_ms": 0.0,
+        }
+
+    def init_access_table(self, session) -> None:
+        with session.cache.responses.connection(commit=True) as conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.ACCESS_TABLE} (key TEXT PRIMARY KEY, last_access REAL)"
+            )
+
+    def record_access(self, response, *args, **kwargs):
+        """requests response hook: remember when each cache key was last used.
+
+        Sessions are only used from worker threads, so the write stays off the event loop.
+        """
+        cache_key = getattr(response, "cache_key", None)
+        if cache_key and _cache_session is not None:
+            try:
+                with _cache_session.cache.responses.connection(commit=True) as conn:
+                    conn.execute(
+                        f"INSERT OR REPLACE INTO {self.ACCESS_TABLE} (key, last_access) VALUES (?, ?)",
+                        (cache_key, time.time())
+                    )
+            except sqlite3.Error as e:
+                logger.debug(f"Could not record HTTP cache access: {str(e)}")
+        return response
+
+    def run_once(self) -> None:
+        """One maintenance pass; blocking, so it runs in a worker thread"""
+        if _cache_session is None:
+            # Other worker processes may be filling the store even if this one never used it
+            if not os.path.exists(f"{CONFIG['HTTP_CACHE_NAME']}.sqlite"):
+                return
+            get_cache_session()
+        started = time.perf_counter()
+        cache = _cache_session.cache
+        responses = cache.responses
+        table = responses.table_name
+        ttl = CONFIG["WEATHER_API_CACHE_EXPIRE"]
+
+        with responses.connection(commit=True) as conn:
+            removed = conn.execute(
+                f"DELETE FROM {table} WHERE expires <= ?", (round(time.time()),)
+            ).rowcount
+            self.metrics["expired_removed"] += max(removed, 0)
+            conn.execute(
+                f"DELETE FROM {self.ACCESS_TABLE} WHERE key NOT IN (SELECT key FROM {table})"
+            )
+
+            total = conn.execute(f"SELECT COALESCE(SUM(LENGTH(value)), 0) FROM {table}").fetchone()[0]
+            if total > self.max_bytes:
+                # Least recently used first; never-read entries fall back to their write time
+                rows = conn.execute(
+                    f"SELECT r.key, LENGTH(r.value) FROM {table} r "
+                    f"LEFT JOIN {self.ACCESS_TABLE} a ON a.key = r.key "
+                    f"ORDER BY COALESCE(a.last_access, COALESCE(r.expires, 0) - ?)",
+                    (ttl,)
+                ).fetchall()
+                evict = []
+                target = self.max_bytes * 0.9
+                for key, size in rows:
+                    if total <= target:
+                        break
+                    evict.append((key,))
+                    total -= size or 0
+                conn.executemany(f"DELETE FROM {table} WHERE key = ?", evict)
+                conn.executemany(f"DELETE FROM {self.ACCESS_TABLE} WHERE key = ?", evict)
+                self.metrics["evicted"] += len(evict)
+            self.metrics["entries"] = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+        cache._prune_redirects()
+        self.metrics["runs"] += 1
+        with responses.connection() as conn:
+            if self.metrics["runs"] % self.vacuum_every == 0:
+                conn.execute("VACUUM")
+                self.metrics["vacuums"] += 1
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.metrics["size_bytes"] = responses.size()
+        self.metrics["last_run_ms"] = round((time.perf_counter() - started) * 1000, 1)
 
-# Create retry session with minimal configuration
-retry_session = retry(
-    cache_session,
-    retries=5,
-    backoff_factor=0.2
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                logger.error(f"HTTP cache maintenance failed: {str(e)}")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+http_cache_maintainer = HttpCacheMaintainer(
+    CONFIG["HTTP_CACHE_MAX_BYTES"],
+    CONFIG["HTTP_CACHE_MAINTENANCE_INTERVAL"],
+    CONFIG["HTTP_CACHE_VACUUM_EVERY"]
 )
 
-# Create OpenMeteo client
-openmeteo = openmeteo_requests.Client(session=retry_session)
+# Event loop monitoring
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class LoopWatchdog:
+    """Measures event loop lag and logs the blocking stack when the loop stalls"""
+
+    def __init__(self, interval: float, threshold: float):
+        self.interval = interval
+        self.threshold = threshold
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self.metrics = {"stalls": 0, "max_lag_ms": 0.0, "last_lag_ms": 0.0}
+
+    async def _beat(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - expected)
+            self.metrics["last_lag_ms"] = round(lag * 1000, 1)
+            self.metrics["max_lag_ms"] = max(self.metrics["max_lag_ms"], self.metrics["last_lag_ms"])
+            self._heartbeat = time.monotonic()
+
+    @staticmethod
+    def _blocking_handler(stack: traceback.StackSummary) -> str:
+        """Name the app function the loop is stuck in.
+
+        Frames above the innermost asyncio callback are main()/run_polling; the first
+        app.py frame below it is the coroutine the loop is currently running.
+        """
+        dispatch = max(
+            (i for i, f in enumerate(stack) if os.path.basename(f.filename) == "events.py"
+             and f.name == "_run"),
+            default=-1
+        )
+        return next((f.name for f in stack[dispatch + 1:] if f.filename == __file__), "unknown")
+
+    def _report(self, stalled_for: float, handler: str, stack: traceback.StackSummary) -> None:
+        self.metrics["stalls"] += 1
+        logger.warning(
+            f"Event loop blocked for {stalled_for:.2f}s in {handler}:\n"
+            + "".join(traceback.format_list(stack[-15:]))
+        )
+
+    def _monitor(self) -> None:
+        """Runs in its own thread, so it can see the loop while the loop is blocked.
+
+        The stack is captured while the loop is stuck; the report waits for the
+        next heartbeat so it carries the real stall duration.
+        """
+        pending = None  # (heartbeat, handler, stack) of the stall in progress
+        while not self._stop.wait(self.interval):
+            heartbeat = self._heartbeat
+            if pending is not None:
+                if heartbeat == pending[0]:
+                    continue
+                self._report(heartbeat - pending[0] - self.interval, pending[1], pending[2])
+                pending = None
+            if time.monotonic() - heartbeat - self.interval < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            pending = (heartbeat, self._blocking_handler(stack), stack)
+        if pending is not None:
+            stalled_for = time.monotonic() - pending[0] - self.interval
+            self._report(stalled_for, f"{pending[1]} (still blocked at shutdown)", pending[2])
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._beat())
+        threading.Thread(target=self._monitor, name="loop-watchdog", daemon=True).start()
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stop.set()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+loop_watchdog = LoopWatchdog(CONFIG["WATCHDOG_INTERVAL"], CONFIG["STALL_THRESHOLD"])
+
+def sample_profile(seconds: float, interval: float, path: Path) -> int:
+    """Sample every thread's stack for a while and write folded stacks for flamegraph tools.
+
+    Blocking; run it in a worker thread. Returns the number of samples taken.
+    """
+    own_id = threading.get_ident()
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    stacks: Counter = Counter()
+    samples = 0
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            labels.append(names.get(thread_id, str(thread_id)))
+            stacks[";".join(reversed(labels))] += 1
+        samples += 1
+        time.sleep(interval)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    return samples
+
+# Per-user and per-chat data limits
+def deep_sizeof(obj: Any, seen: Optional[set] = None) -> int:
+    """Approximate memory used by an object and everything it contains"""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    return size
+
+class DataSweeper:
+    """Drops user_data/chat_data and conversation state of idle users and chats, and caps
+    how many are kept.
+
+    Activity is recorded by a TypeHandler that runs before every other handler.
+    """
+
+    def __init__(self, idle_ttl: float, max_entries: int, interval: float, memory_sample: int):
+        self.idle_ttl = idle_ttl
+        self.max_entries = max_entries
+        self.interval = interval
+        self.memory_sample = memory_sample
+        self._users: "OrderedDict[int, float]" = OrderedDict()  # least recently active first
+        self._chats: "OrderedDict[int, float]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+        self.metrics: Dict[str, Any] = {
+            "users": 0, "chats": 0, "conversations": 0, "dropped_idle": 0, "dropped_over_cap": 0
+        }
+        self.memory: Dict[str, int] = {}
+
+    async def touch(self, update: object, context: CallbackContext) -> None:
+        """TypeHandler callback: mark the update's user and chat as active"""
+        now = time.monotonic()
+        if isinstance(update, Update):
+            if update.effective_user:
+                self._users[update.effective_user.id] = now
+                self._users.move_to_end(update.effective_user.id)
+            if update.effective_chat:
+                self._chats[update.effective_chat.id] = now
+                self._chats.move_to_end(update.effective_chat.id)
+
+    @staticmethod
+    def _sweep_store(activity: "OrderedDict[int, float]", store, drop, idle_ttl: float,
+                     max_entries: int) -> Tuple[int, int]:
+        now = time.monotonic()
+        for key in store:
+            if key not in activity:
+                # Data created outside an update (e.g. by a non-blocking handler after a
+                # drop); it counts as active now, which keeps the oldest-first order
+                activity[key] = now
+        idle = over_cap = 0
+        while activity:
+            key, last_seen = next(iter(activity.items()))
+            if now - last_seen > idle_ttl:
+                idle += 1
+            elif len(activity) > max_entries:
+                over_cap += 1
+            else:
+                break
+            del activity[key]
+            if key in store:
+                drop(key)
+        return idle, over_cap
+
+    def _prune_conversations(self, application: Application) -> int:
+        """Forget conversation states of users and chats that are no longer tracked.
+
+        PTB only removes a conversation when it ends, and conversation_timeout needs a
+        JobQueue, so states would otherwise pile up for every user who ever pressed /start.
+        """
+        conversations = 0
+        for handlers in application.handlers.values():
+            for handler in handlers:
+                if not isinstance(handler, ConversationHandler) or handler.per_message:
+                    continue
+                states = handler._conversations
+                for key in list(states):
+                    # Keys are (chat_id, user_id), or just one of them
+                    chat_id = key[0] if handler.per_chat else None
+                    user_id = key[-1] if handler.per_user else None
+                    if (chat_id is not None and chat_id not in self._chats) or (
+                            user_id is not None and user_id not in self._users):
+                        del states[key]
+                conversations += len(states)
+        return conversations
+
+    def _estimate_memory(self, store) -> Counter:
+        """Size a random sample of entries and scale up; sizing every user would block the loop"""
+        entries = list(store.values())
+        if len(entries) > self.memory_sample:
+            sample = random.sample(entries, self.memory_sample)
+        else:
+            sample = entries
+        memory: Counter = Counter()
+        for data in sample:
+            for key, value in data.items():
+                memory[key] += deep_sizeof(value)
+        scale = len(entries) / len(sample) if sample else 0
+        return Counter({key: int(size * scale) for key, size in memory.items()})
+
+    def sweep(self, application: Application) -> None:
+        """Drop idle and over-cap entries, then estimate memory per category"""
+        for activity, store, drop in (
+            (self._users, application.user_data, application.drop_user_data),
+            (self._chats, application.chat_data, application.drop_chat_data),
+        ):
+            idle, over_cap = self._sweep_store(activity, store, drop, self.idle_ttl, self.max_entries)
+            self.metrics["dropped_idle"] += idle
+            self.metrics["dropped_over_cap"] += over_cap
+        self.metrics["users"] = len(application.user_data)
+        self.metrics["chats"] = len(application.chat_data)
+        self.metrics["conversations"] = self._prune_conversations(application)
+
+        memory: Counter = Counter()
+        for scope, store in (("user", application.user_data), ("chat", application.chat_data)):
+            for key, size in self._estimate_memory(store).items():
+                memory[f"{scope}:{key}"] = size
+        self.memory = dict(memory.most_common())
+
+    async def _run(self, application: Application) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.sweep(application)
+            except Exception as e:
+                logger.error(f"User data sweep failed: {str(e)}")
+
+    def start(self, application: Application) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(application))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+data_sweeper = DataSweeper(
+    CONFIG["USER_IDLE_TTL"], CONFIG["USER_DATA_MAX"], CONFIG["SWEEP_INTERVAL"], CONFIG["SWEEP_MEMORY_SAMPLE"]
+)
 
 # Helper Functions
 async def show_typing(context: CallbackContext, chat_id: int, duration: float = 1.0):
@@ -95,6 +576,29 @@ def validate_question(question: str) -> bool:
         return False
     return True
 
+def is_admin(user_id: int) -> bool:
+    """Check whether a user may run admin commands"""
+    return user_id in CONFIG["ADMIN_IDS"]
+
+def spawn_background(coro) -> asyncio.Task:
+    """Run a coroutine in the background and keep a reference until it finishes"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+async def drain_background(timeout: float) -> None:
+    """Wait for background tasks to finish, cancelling whatever is left after the timeout"""
+    if not _background_tasks:
+        return
+    tasks = list(_background_tasks)
+    _, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if pending:
+        logger.warning(f"Cancelled {len(pending)} background task(s) still running at shutdown")
+
 def rate_limit_user(user_id: int, context: ContextTypes.DEFAULT_TYPE) -> bool:
     """Simple rate limiting for users"""
     now = datetime.now()
@@ -106,6 +610,139 @@ def rate_limit_user(user_id: int, context: ContextTypes.DEFAULT_TYPE) -> bool:
     context.user_data['last_request'] = now
     return False
 
+# Rendering
+# Telegram's legacy Markdown: *bold*, _italic_, `code`, ```pre```, [text](url).
+# Outside entities the markers are escaped with a backslash; inside one they are literal,
+# so an entity's text must not contain its own closing marker.
+_MD_SPECIAL_RE = re.compile(r'([_*`\[])')
+_MD_LINK_RE = re.compile(r'\[([^\[\]\n]+)\]\(([^()\s]+)\)')
+_MD_PARAGRAPH_SEPARATORS = ("\n\n", "\n", " ")
+
+def md_escape(text: Any) -> str:
+    """Escape untrusted text for use outside Markdown entities"""
+    return _MD_SPECIAL_RE.sub(r'\\\1', str(text))
+
+def md_bold(text: Any) -> str:
+    """Bold untrusted text"""
+    return f"*{str(text).replace('*', '')}*"
+
+def md_link(label: Any, url: str) -> str:
+    """Inline link with untrusted label and URL"""
+    return f"[{str(label).replace(']', '')}]({url.replace(')', '%29').replace(' ', '%20')})"
+
+def md_balance(text: str) -> str:
+    """Make free-form Markdown (e.g. AI output) parseable.
+
+    Well-formed entities are kept; markers without a partner on the same line
+    (or an unterminated code block) are escaped.
+    """
+    out = []
+    i, n = 0, len(text)
+    while i < n:
+        ch = text[i]
+        if ch == '\\' and i + 1 < n and text[i + 1] in '_*`[':
+            out.append(text[i:i + 2])
+            i += 2
+        elif text.startswith('```', i):
+            end = text.find('```', i + 3)
+            if end == -1:
+                out.append('\\`\\`\\`')
+                i += 3
+            else:
+                out.append(text[i:end + 3])
+                i = end + 3
+        elif ch == '_' and 0 < i < n - 1 and text[i - 1].isalnum() and text[i + 1].isalnum():
+            # snake_case words are not italics
+            out.append('\\_')
+            i += 1
+        elif ch in '*_`':
+            end = text.find(ch, i + 1)
+            line_end = text.find('\n', i + 1)
+            if end > i + 1 and (line_end == -1 or end < line_end):
+                out.append(text[i:end + 1])
+                i = end + 1
+            else:
+                out.append('\\' + ch)
+                i += 1
+        elif ch == '[':
+            match = _MD_LINK_RE.match(text, i)
+            if match:
+                out.append(match.group(0))
+                i = match.end()
+            else:
+                out.append('\\[')
+                i += 1
+        else:
+            out.append(ch)
+            i += 1
+    return ''.join(out)
+
+def _utf16_len(text: str) -> int:
+    return len(text.encode('utf-16-le')) // 2
+
+def _pack_chunks(text: str, limit: int, separators: Tuple[str, ...]) -> List[str]:
+    """Split text into chunks within limit, preferring the earliest separator"""
+    if _utf16_len(text) <= limit:
+        return [text]
+    if not separators:
+        chunks, current = [], ""
+        for ch in text:
+            if _utf16_len(current + ch) > limit:
+                chunks.append(current)
+                current = ""
+            current += ch
+        return chunks + [current] if current else chunks
+
+    separator, rest = separators[0], separators[1:]
+    chunks, current = [], ""
+    for part in text.split(separator):
+        for piece in _pack_chunks(part, limit, rest):
+            candidate = f"{current}{separator}{piece}" if current else piece
+            if _utf16_len(candidate) <= limit:
+                current = candidate
+            else:
+                if current:
+                    chunks.append(current)
+                current = piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+def split_message(text: str, limit: Optional[int] = None) -> List[str]:
+    """Split a message at paragraph, then line, then word boundaries to fit Telegram's limit"""
+    limit = limit or CONFIG["MESSAGE_LIMIT"]
+    # Leave room to close and reopen a code block cut between chunks
+    chunks = _pack_chunks(text, limit - 8, _MD_PARAGRAPH_SEPARATORS)
+    for index in range(len(chunks) - 1):
+        if chunks[index].count('```') % 2:
+            chunks[index] += "\n```"
+            chunks[index + 1] = "```\n" + chunks[index + 1]
+    return chunks or [text]
+
+async def _send_chunks(send, text: str, reply_markup=None, **kwargs):
+    """Send Markdown text in chunks, attaching the keyboard to the last one"""
+    chunks = split_message(text)
+    message = None
+    for index, chunk in enumerate(chunks):
+        markup = reply_markup if index == len(chunks) - 1 else None
+        try:
+            message = await send(text=chunk, parse_mode="Markdown", reply_markup=markup, **kwargs)
+        except BadRequest as e:
+            if "parse entities" not in str(e):
+                raise
+            # Rendering should prevent this; send the text as-is rather than fail the update
+            logger.warning(f"Markdown rejected, sending as plain text: {str(e)}")
+            message = await send(text=chunk, reply_markup=markup, **kwargs)
+    return message
+
+async def reply_markdown(message, text: str, reply_markup=None, **kwargs):
+    """Reply to a message with rendered Markdown, split to fit Telegram's limit"""
+    return await _send_chunks(message.reply_text, text, reply_markup, **kwargs)
+
+async def send_markdown(bot, chat_id: int, text: str, reply_markup=None, **kwargs):
+    """Send rendered Markdown to a chat, split to fit Telegram's limit"""
+    return await _send_chunks(bot.send_message, text, reply_markup, chat_id=chat_id, **kwargs)
+
 # Keyboards
 def main_menu() -> InlineKeyboardMarkup:
     """Generate main menu keyboard"""
@@ -173,26 +810,322 @@ def back_button() -> InlineKeyboardMarkup:
     """Simple back button"""
     return InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data='back')]])
 
+class TTLCache:
+    """Small in-memory cache with per-entry expiry and a size cap"""
+
+    def __init__(self, ttl: float, max_entries: int = 1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str, allow_stale: bool = False) -> Optional[Any]:
+        """Return a fresh value (or a recently expired one with allow_stale) or None"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        now = time.time()
+        if expires < now and not (allow_stale and expires + CONFIG["STALE_MAX_AGE"] >= now):
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a value, evicting the least recently used entries over the cap"""
+        self._data[key] = (time.time() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def prefix_values(self, prefix: str, limit: int) -> List[Any]:
+        """Values of unexpired entries whose key starts with prefix"""
+        now = time.time()
+        values = []
+        for key, (expires, value) in self._data.items():
+            if expires >= now and key.startswith(prefix):
+                values.append(value)
+                if len(values) >= limit:
+                    break
+        return values
+
+    def dump(self) -> List[List[Any]]:
+        """Unexpired entries as [key, expires, value], least recently used first"""
+        now = time.time()
+        return [[key, expires, value] for key, (expires, value) in self._data.items() if expires >= now]
+
+    def load(self, entries: List[List[Any]]) -> int:
+        """Restore entries produced by dump(), keeping their original expiry"""
+        now = time.time()
+        loaded = 0
+        for key, expires, value in entries:
+            if expires >= now and key not in self._data:
+                self._data[key] = (expires, value)
+                loaded += 1
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+        return loaded
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+class SQLiteTTLCache:
+    """TTL cache kept in a shared SQLite database (WAL mode) so worker processes share entries.
+
+    Calls run on the event loop, so they wait only briefly for a lock held by another
+    worker and otherwise act as a cache miss (or skip the write).
+    """
+
+    TRIM_EVERY = 50  # writes between size-cap checks
+
+    def __init__(self, path: str, namespace: str, ttl: float, max_entries: int = 1000):
+        self.path = path
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._writes = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        """Open the database lazily, and again in a forked child process"""
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(
+                self.path,
+                timeout=CONFIG["SHARED_CACHE_BUSY_TIMEOUT"],
+                isolation_level=None,
+                check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, expires REAL NOT NULL, value TEXT NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_expires ON cache(namespace, expires)")
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def get(self, key: str, allow_stale: bool = False) -> Optional[Any]:
+        """Return a fresh value (or a recently expired one with allow_stale) or None"""
+        min_expires = time.time() - (CONFIG["STALE_MAX_AGE"] if allow_stale else 0)
+        try:
+            row = self._connection().execute(
+                "SELECT value FROM cache WHERE namespace = ? AND key = ? AND expires >= ?",
+                (self.namespace, key, min_expires)
+            ).fetchone()
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Shared cache read skipped ({self.namespace}): {str(e)}")
+            return None
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a value, dropping the oldest entries over the cap"""
+        conn = self._connection()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, expires, value) VALUES (?, ?, ?, ?)",
+                (self.namespace, key, time.time() + self.ttl, json.dumps(value, separators=(",", ":")))
+            )
+            self._writes += 1
+            if self._writes % self.TRIM_EVERY == 0:
+                conn.execute(
+                    "DELETE FROM cache WHERE namespace = ? AND key NOT IN "
+                    "(SELECT key FROM cache WHERE namespace = ? ORDER BY expires DESC LIMIT ?)",
+                    (self.namespace, self.namespace, self.max_entries)
+                )
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Shared cache write skipped ({self.namespace}): {str(e)}")
+
+    def prefix_values(self, prefix: str, limit: int) -> List[Any]:
+        """Values of unexpired entries whose key starts with prefix, in one indexed range query"""
+        query = "SELECT value FROM cache WHERE namespace = ? AND expires >= ?"
+        params: List[Any] = [self.namespace, time.time()]
+        if prefix:
+            # Keys in [prefix, prefix with its last character bumped) all start with prefix
+            query += " AND key >= ? AND key < ?"
+            params += [prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)]
+        try:
+            rows = self._connection().execute(query + " LIMIT ?", params + [limit]).fetchall()
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Shared cache read skipped ({self.namespace}): {str(e)}")
+            return []
+        return [json.loads(row[0]) for row in rows]
+
+    def __len__(self) -> int:
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM cache WHERE namespace = ?", (self.namespace,)
+        ).fetchone()[0]
+
+# Caches by namespace, for snapshots
+_caches: Dict[str, Any] = {}
+
+def make_cache(namespace: str, ttl: float):
+    """Create a cache, shared across processes when SHARED_CACHE_PATH is configured"""
+    if CONFIG["SHARED_CACHE_PATH"]:
+        cache = SQLiteTTLCache(CONFIG["SHARED_CACHE_PATH"], namespace, ttl)
+    else:
+        cache = TTLCache(ttl)
+    _caches[namespace] = cache
+    return cache
+
+def save_cache_snapshot(path: str) -> None:
+    """Write in-memory caches to a gzipped JSON file so a restart starts warm"""
+    snapshot = {
+        "saved_at": time.time(),
+        "caches": {name: cache.dump() for name, cache in _caches.items() if isinstance(cache, TTLCache)},
+    }
+    if not snapshot["caches"]:
+        return  # SQLite-backed caches already persist on disk
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+        json.dump(snapshot, f, separators=(",", ":"), ensure_ascii=False)
+    os.replace(tmp_path, path)
+    total = sum(len(entries) for entries in snapshot["caches"].values())
+    logger.info(f"Saved {total} cache entries to {path}")
+
+def load_cache_snapshot(path: str) -> None:
+    """Reload caches saved by save_cache_snapshot, skipping expired entries"""
+    if not os.path.exists(path):
+        return
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable cache snapshot {path}: {str(e)}")
+        return
+
+    loaded = 0
+    for name, entries in snapshot.get("caches", {}).items():
+        cache = _caches.get(name)
+        if isinstance(cache, TTLCache):
+            loaded += cache.load(entries)
+    logger.info(f"Loaded {loaded} cache entries from {path}")
+
+class Deadline:
+    """Backend time budget for handling a single update"""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, cap: float) -> float:
+        """A backend's own timeout, shortened to what is left of the budget"""
+        return min(cap, self.remaining())
+
+async def call_backend(func, *args, timeout: float, deadline: Optional[Deadline] = None, **kwargs):
+    """Run a blocking backend call in a thread, bounded by its timeout and the update's deadline.
+
+    The effective timeout is passed on to func so the HTTP call gives up too; raises
+    TimeoutError once the budget is spent.
+    """
+    if deadline is not None:
+        timeout = deadline.timeout(timeout)
+    if timeout <= 0:
+        raise TimeoutError("Deadline exceeded before backend call")
+    return await asyncio.wait_for(asyncio.to_thread(func, *args, timeout=timeout, **kwargs), timeout)
+
 class AIService:
     """Wrapper class for AI services with improved error handling and caching"""
 
+    _cache = make_cache("ai", CONFIG["AI_CACHE_EXPIRE"])
+
+    @staticmethod
+    def build_prompt(
+        prompt: str,
+        system_message: str = "",
+        history: Optional[Sequence[Tuple[str, str]]] = None
+    ) -> str:
+        """Assemble the prompt, fitting past turns into CONFIG["AI_PROMPT_BUDGET"] characters.
+
+        The newest turns are kept verbatim; older ones that do not fit are reduced
+        to their questions, and dropped once even that does not fit.
+        """
+        head = f"{system_message}\n\n" if system_message else ""
+        if not history:
+            return f"{head}{prompt}".strip()
+
+        question = f"Question: {prompt}"
+        header = "Conversation so far:\n"
+        budget = CONFIG["AI_PROMPT_BUDGET"] - len(head) - len(header) - len(question) - 1
+        kept: List[str] = []
+        older: List[str] = []
+        for past_question, past_answer in reversed(history):
+            turn = f"Q: {past_question}\nA: {past_answer}\n"
+            if not older and len(turn) <= budget:
+                kept.append(turn)
+                budget -= len(turn)
+            else:
+                older.append(past_question)
+
+        topics: List[str] = []
+        budget -= len("Earlier topics: \n")
+        for past_question in older:
+            if len(past_question) + 2 > budget:
+                break
+            topics.append(past_question)
+            budget -= len(past_question) + 2
+        summary = f"Earlier topics: {'; '.join(topics)}\n" if topics else ""
+
+        context = summary + "".join(reversed(kept))
+        if context:
+            context = f"{header}{context}\n"
+        return f"{head}{context}{question}".strip()
+
+    @staticmethod
+    def cache_key(
+        prompt: str,
+        system_message: str = "",
+        max_tokens: int = 1000,
+        history: Optional[Sequence[Tuple[str, str]]] = None
+    ) -> str:
+        """Cache key for a prompt as sent to the API"""
+        return AIService._prompt_key(AIService.build_prompt(prompt, system_message, history), max_tokens)
+
+    @staticmethod
+    def _prompt_key(full_prompt: str, max_tokens: int) -> str:
+        # The one place the key format lives; is_cached and the prefetcher rely on it
+        return f"{max_tokens}:{full_prompt}"
+
+    @staticmethod
+    def is_cached(prompt: str, system_message: str = "", max_tokens: int = 1000) -> bool:
+        """Check whether a fresh cached response exists for a prompt"""
+        return AIService._cache.get(AIService.cache_key(prompt, system_message, max_tokens)) is not None
+
     @staticmethod
     async def fetch_ai_response(
         prompt: str,
         system_message: str = "",
         max_tokens: int = 1000,
-        model: str = "DeepSeek-R1"
+        model: str = "DeepSeek-R1",
+        cache: bool = False,
+        deadline: Optional[Deadline] = None,
+        history: Optional[Sequence[Tuple[str, str]]] = None
     ) -> str:
         """Fetch response from DeepSeek-R1 model via BetaDash API"""
+        cache_key = ""
         try:
-            full_prompt = f"{system_message}\n\n{prompt}" if system_message else prompt
-            full_prompt = full_prompt.strip()
+            full_prompt = AIService.build_prompt(prompt, system_message, history)
+
+            cache_key = AIService._prompt_key(full_prompt, max_tokens)
+            if cache:
+                cached = AIService._cache.get(cache_key)
+                if cached:
+                    return cached
 
             url = "https://betadash-api-swordslush-production.up.railway.app/Deepseek-R1"
             params = {"ask": full_prompt}
             headers = {"Content-Type": "application/json"}
 
-            response = requests.get(url, params=params, headers=headers, timeout=15)
+            response = await call_backend(
+                requests.get, url, params=params, headers=headers, timeout=15, deadline=deadline
+            )
             response.raise_for_status()
 
             data = response.json()
@@ -204,42 +1137,303 @@ class AIService:
 
             if len(content) > max_tokens:
                 content = content[:max_tokens] + "..."
+            content = md_balance(content)
 
+            if cache and "response" in data:
+                AIService._cache.set(cache_key, content)
             return content
 
-        except requests.exceptions.Timeout:
+        except (requests.exceptions.Timeout, TimeoutError):
             logger.warning("DeepSeek API request timed out")
+            stale = AIService._cache.get(cache_key, allow_stale=True) if cache and cache_key else None
+            if stale:
+                return stale
             return "⚠️ Aero Bot service is taking too long to respond. Please try again later."
         except requests.exceptions.RequestException as e:
             logger.error(f"DeepSeek API request failed: {str(e)}")
+            stale = AIService._cache.get(cache_key, allow_stale=True) if cache and cache_key else None
+            if stale:
+                return stale
             return "⚠️ Aero Bot service is currently unavailable. Please try again later."
         except Exception as e:
             logger.error(f"Unexpected DeepSeek error: {str(e)}")
             return "⚠️ An unexpected error occurred. Please try again."
 
+# Weather providers
+class WeatherProvider:
+    """A weather backend returning data in the Kaiz schema used by the handlers:
+
+    {"location": {"name"}, "current": {"temperature", "feelslike", "skytext", "humidity",
+    "winddisplay", "day", "date", "observationtime"}, "forecast": [{"shortday", "day", "date",
+    "high", "low", "skytextday", "precip"}, ...]} with values as strings.
+    """
+
+    name = ""
+    timeout = 10
+
+    def __init__(self):
+        self.latencies: deque = deque(maxlen=200)
+        self.requests = 0
+        self.wins = 0
+        self.failures = 0
+
+    def fetch(self, city: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Blocking fetch; returns None when the city is unknown"""
+        raise NotImplementedError
+
+    def _timed_fetch(self, city: str, timeout: float) -> Optional[Dict[str, Any]]:
+        # Timed in the worker thread, so calls that lost a race still count. Only answers
+        # count: a provider that fails fast must not look like the fastest one
+        started = time.monotonic()
+        result = self.fetch(city, timeout)
+        if result:
+            self.latencies.append(time.monotonic() - started)
+        return result
+
+    async def get(self, city: str, deadline: Optional[Deadline] = None) -> Optional[Dict[str, Any]]:
+        """Fetch within the deadline; errors are logged and reported as None"""
+        self.requests += 1
+        try:
+            return await call_backend(self._timed_fetch, city, timeout=self.timeout, deadline=deadline)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"{self.name} weather error for '{city}': {str(e) or type(e).__name__}")
+            return None
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """Latency percentile in seconds, or None without enough samples"""
+        if len(self.latencies) < CONFIG["HEDGE_MIN_SAMPLES"]:
+            return None
+        samples = sorted(self.latencies)
+        return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+    def hedge_delay(self) -> float:
+        """How long to wait on this provider before asking another one"""
+        delay = self.percentile(CONFIG["HEDGE_PERCENTILE"])
+        return CONFIG["HEDGE_DEFAULT_DELAY"] if delay is None else max(delay, 0.2)
+
+    def stats(self) -> Dict[str, Any]:
+        p50, p90 = self.percentile(50), self.percentile(90)
+        return {
+            "requests": self.requests,
+            "wins": self.wins,
+            "win_rate": f"{self.wins / self.requests:.0%}" if self.requests else "n/a",
+            "failures": self.failures,
+            "p50_ms": round(p50 * 1000) if p50 is not None else "n/a",
+            "p90_ms": round(p90 * 1000) if p90 is not None else "n/a",
+        }
+
+class KaizProvider(WeatherProvider):
+    """Kaiz Weather API; already returns the handler schema"""
+
+    name = "Kaiz"
+
+    def fetch(self, city: str, timeout: float) -> Optional[Dict[str, Any]]:
+        clean_city = clean_input(city.replace(' ', '+'))  # Format for URL
+        url = f"https://kaiz-apis.gleeze.com/api/weather?q={clean_city}"
+
+        response = requests.get(url, timeout=timeout)
+        response.raise_for_status()
+        data = response.json()
+
+        if not data or "0" not in data:
+            return None
+        return data["0"]
+
+class OpenMeteoProvider(WeatherProvider):
+    """Open-Meteo geocoding and forecast APIs, normalized to the Kaiz schema"""
+
+    name = "Open-Meteo"
+
+    GEOCODING_URL = "https://geocoding-api.open-meteo.com/v1/search"
+    FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+    CURRENT = ["temperature_2m", "apparent_temperature", "relative_humidity_2m",
+               "weather_code", "wind_speed_10m", "wind_direction_10m"]
+    DAILY = ["weather_code", "temperature_2m_max", "temperature_2m_min", "precipitation_probability_max"]
+
+    # WMO weather interpretation codes, in the wording Kaiz uses
+    WMO_CODES = {
+        0: "Sunny", 1: "Mostly Sunny", 2: "Partly Cloudy", 3: "Cloudy",
+        45: "Fog", 48: "Fog",
+        51: "Light Drizzle", 53: "Drizzle", 55: "Heavy Drizzle", 56: "Freezing Drizzle", 57: "Freezing Drizzle",
+        61: "Light Rain", 63: "Rain", 65: "Heavy Rain", 66: "Freezing Rain", 67: "Freezing Rain",
+        71: "Light Snow", 73: "Snow", 75: "Heavy Snow", 77: "Snow Grains",
+        80: "Light Rain Showers", 81: "Rain Showers", 82: "Heavy Rain Showers",
+        85: "Snow Showers", 86: "Heavy Snow Showers",
+        95: "T-Storms", 96: "T-Storms with Hail", 99: "T-Storms with Hail",
+    }
+    COMPASS = ["North", "Northeast", "East", "Southeast", "South", "Southwest", "West", "Northwest"]
+
+    def __init__(self):
+        super().__init__()
+        self._client = None
+
+    def client(self):
+        """Open-Meteo client without retries.
+
+        call_backend can only stop waiting, not stop the worker thread, so the retrying
+        client would keep calling upstream long after the deadline or a lost race.
+        Hedging is the retry here.
+        """
+        if self._client is None:
+            import openmeteo_requests
+
+            self._client = openmeteo_requests.Client(session=get_cache_session())
+        return self._client
+
+    def fetch(self, city: str, timeout: float) -> Optional[Dict[str, Any]]:
+        started = time.monotonic()
+        geo = get_cache_session().get(
+            self.GEOCODING_URL, params={"name": city, "count": 1}, timeout=timeout
+        )
+        geo.raise_for_status()
+        places = geo.json().get("results")
+        if not places:
+            return None
+        place = places[0]
+
+        remaining = max(0.1, timeout - (time.monotonic() - started))
+        response = self.client().weather_api(
+            self.FORECAST_URL,
+            params={
+                "latitude": place["latitude"],
+                "longitude": place["longitude"],
+                "current": self.CURRENT,
+                "daily": self.DAILY,
+                "timezone": "auto",
+                "forecast_days": 5,
+            },
+            timeout=remaining
+        )[0]
+        return self._normalize(place, response)
+
+    def _normalize(self, place: Dict[str, Any], response) -> Dict[str, Any]:
+        offset = response.UtcOffsetSeconds()
+        current = response.Current()
+        values = {name: current.Variables(i).Value() for i, name in enumerate(self.CURRENT)}
+        observed = datetime.fromtimestamp(current.Time() + offset, tz=timezone.utc)
+        wind_direction = self.COMPASS[round(values["wind_direction_10m"] / 45) % 8]
+
+        daily = response.Daily()
+        forecast = []
+        for day_index in range(daily.Variables(0).ValuesLength()):
+            day = datetime.fromtimestamp(daily.Time() + day_index * daily.Interval() + offset, tz=timezone.utc)
+            daily_values = {
+                name: daily.Variables(i).Values(day_index) for i, name in enumerate(self.DAILY)
+            }
+            precip = daily_values["precipitation_probability_max"]
+            if math.isnan(precip):  # the SDK reports missing values as NaN
+                precip = 0
+            forecast.append({
+                "shortday": day.strftime("%a"),
+                "day": day.strftime("%A"),
+                "date": day.strftime("%Y-%m-%d"),
+                "high": str(round(daily_values["temperature_2m_max"])),
+                "low": str(round(daily_values["temperature_2m_min"])),
+                "skytextday": self.WMO_CODES.get(int(daily_values["weather_code"]), "Unknown"),
+                "precip": str(round(precip)),
+            })
+
+        name = place["name"]
+        if place.get("country"):
+            name = f"{name}, {place['country']}"
+        return {
+            "location": {"name": name},
+            "current": {
+                "temperature": str(round(values["temperature_2m"])),
+                "feelslike": str(round(values["apparent_temperature"])),
+                "skytext": self.WMO_CODES.get(int(values["weather_code"]), "Unknown"),
+                "humidity": str(round(values["relative_humidity_2m"])),
+                "winddisplay": f"{round(values['wind_speed_10m'])} km/h {wind_direction}",
+                "day": observed.strftime("%A"),
+                "date": observed.strftime("%Y-%m-%d"),
+                "observationtime": observed.strftime("%H:%M:%S"),
+            },
+            "forecast": forecast,
+        }
+
 # Weather Service
 class WeatherService:
-    """Weather service using Kaiz Weather API"""
-    
+    """Weather service racing Kaiz and Open-Meteo with hedged requests"""
+
+    _cache = make_cache("weather", CONFIG["WEATHER_API_CACHE_EXPIRE"])
+    providers: List[WeatherProvider] = [KaizProvider(), OpenMeteoProvider()]
+    hedges = 0
+
+    @staticmethod
+    def cache_key(city: str) -> str:
+        """Normalize a city name into a cache key"""
+        return clean_input(city).lower()
+
+    @staticmethod
+    def get_cached_weather(city: str, allow_stale: bool = False) -> Optional[Dict[str, Any]]:
+        """Return cached weather data for a city without calling the API"""
+        return WeatherService._cache.get(WeatherService.cache_key(city), allow_stale=allow_stale)
+
     @staticmethod
-    async def get_weather_data(city: str) -> Optional[Dict[str, Any]]:
-        """Fetch weather data from Kaiz Weather API"""
+    def find_cached_cities(prefix: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Return cached weather data for cities starting with the given prefix"""
+        return WeatherService._cache.prefix_values(WeatherService.cache_key(prefix), limit)
+
+    @staticmethod
+    async def race(city: str, deadline: Optional[Deadline] = None) -> Optional[Dict[str, Any]]:
+        """Ask the fastest provider first; hedge with the next one if it is slow or fails.
+
+        The first valid answer wins and the other request is cancelled.
+        """
+        # Fastest median first; providers without enough samples keep their listed order
+        providers = sorted(
+            WeatherService.providers,
+            key=lambda provider: provider.percentile(50) or float("inf")
+        )
+        primary, backups = providers[0], providers[1:]
+        tasks: Dict[asyncio.Task, WeatherProvider] = {
+            asyncio.create_task(primary.get(city, deadline)): primary
+        }
         try:
-            clean_city = clean_input(city.replace(' ', '+'))  # Format for URL
-            url = f"https://kaiz-apis.gleeze.com/api/weather?q={clean_city}"
-            
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            if not data or "0" not in data:
-                return None
-                
-            return data["0"]
-            
-        except Exception as e:
-            logger.error(f"Weather API error for '{city}': {str(e)}")
+            while tasks:
+                timeout = primary.hedge_delay() if backups else None
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    provider = tasks.pop(task)
+                    result = task.result()
+                    if result:
+                        provider.wins += 1
+                        return result
+                if backups:
+                    if not done:
+                        WeatherService.hedges += 1
+                    backup = backups.pop(0)
+                    tasks[asyncio.create_task(backup.get(city, deadline))] = backup
             return None
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    async def get_weather_data(
+        city: str,
+        deadline: Optional[Deadline] = None,
+        refresh: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """Fetch weather data from the fastest provider, falling back to stale data on failure.
+
+        refresh skips the cache, to renew an entry before it expires.
+        """
+        cached = None if refresh else WeatherService.get_cached_weather(city)
+        if cached:
+            return cached
+
+        weather_data = await WeatherService.race(city, deadline)
+        if weather_data:
+            WeatherService._cache.set(WeatherService.cache_key(city), weather_data)
+            return weather_data
+
+        # Every provider failed or timed out; an expired answer beats none
+        stale = WeatherService._cache.get(WeatherService.cache_key(city), allow_stale=True)
+        return dict(stale, stale=True) if stale else None
     
     @staticmethod
     def get_weather_description(skycode: str) -> str:
@@ -283,21 +1477,54 @@ class WeatherService:
         """Simplified forecast format with emojis"""
         forecast_lines = []
         for forecast in forecasts[:5]:
-            day = forecast['shortday']
+            day = md_escape(forecast['shortday'])
             conditions = forecast['skytextday']
             emoji = "☀️" if "sunny" in conditions.lower() else \
                     "🌧️" if "rain" in conditions.lower() else \
                     "⛅" if "cloud" in conditions.lower() else "🌤️"
             
             forecast_lines.append(
-                f"{emoji} {day}: {forecast['high']}°C/{forecast['low']}°C "
-                f"({conditions}, {forecast['precip']}% rain)"
+                f"{emoji} {day}: {md_escape(forecast['high'])}°C/{md_escape(forecast['low'])}°C "
+                f"({md_escape(conditions)}, {md_escape(forecast['precip'])}% rain)"
             )
         return "\n".join(forecast_lines)
 
+    @staticmethod
+    def format_weather_message(weather_data: Dict[str, Any]) -> str:
+        """Format current weather, heat advisory and 5-day forecast"""
+        location = weather_data["location"]["name"]
+        current = weather_data["current"]
+        forecasts = weather_data["forecast"]
+        
+        # Format current weather
+        weather_msg = (
+            "⏳ _Live update timed out, showing the last known data._\n\n" if weather_data.get("stale") else ""
+        )
+        weather_msg += (
+            f"🌤️ {md_bold(f'Current Weather in {location}')}\n"
+            f"📅 {md_escape(current['day'])}, {md_escape(current['date'])}\n"
+            f"⏰ {md_escape(current['observationtime'])}\n\n"
+            f"{md_escape(current['skytext'])}\n"
+            f"🌡️ Temperature: {md_escape(current['temperature'])}°C (Feels like {md_escape(current['feelslike'])}°C)\n"
+            f"💧 Humidity: {md_escape(current['humidity'])}%\n"
+            f"🌬️ Wind: {md_escape(current['winddisplay'])}\n\n"
+        )
+        
+        # Add heat advisory
+        advisory, advice = WeatherService.get_heat_advisory(
+            current["temperature"], 
+            current["feelslike"]
+        )
+        weather_msg += f"⚠️ *{advisory}*\n{advice}\n\n"
+        
+        weather_msg += "🌤️ *5-Day Weather Forecast:*\n"
+        weather_msg += WeatherService.format_simple_forecast(forecasts)
+        return weather_msg
+
 # Handlers
 async def weather_location_handler(update: Update, context: CallbackContext) -> int:
     """Handle weather location input with 5-day forecast"""
+    deadline = Deadline(CONFIG["UPDATE_DEADLINE"])
     if update.message:
         city = clean_input(update.message.text)
         
@@ -311,7 +1538,7 @@ async def weather_location_handler(update: Update, context: CallbackContext) ->
         await show_typing(context, update.message.chat_id)
         
         # Get weather data from Kaiz API
-        weather_data = await WeatherService.get_weather_data(city)
+        weather_data = await WeatherService.get_weather_data(city, deadline)
         
         if not weather_data:
             await update.message.reply_text(
@@ -320,35 +1547,14 @@ async def weather_location_handler(update: Update, context: CallbackContext) ->
             )
             return WEATHER_LOCATION
             
-        # Store weather data
-        context.user_data['weather_data'] = weather_data
+        # Store what the tomorrow forecast needs, not the whole response
+        context.user_data['weather_data'] = {
+            "location": {"name": weather_data["location"]["name"]},
+            "forecast": weather_data["forecast"][:2],
+        }
+        context.user_data['last_city'] = city
             
-        # Extract data from response
-        location = weather_data["location"]["name"]
-        current = weather_data["current"]
-        forecasts = weather_data["forecast"]
-        
-        # Format current weather
-        weather_msg = (
-            f"🌤️ *Current Weather in {location}*\n"
-            f"📅 {current['day']}, {current['date']}\n"
-            f"⏰ {current['observationtime']}\n\n"
-            f"{current['skytext']}\n"
-            f"🌡️ Temperature: {current['temperature']}°C (Feels like {current['feelslike']}°C)\n"
-            f"💧 Humidity: {current['humidity']}%\n"
-            f"🌬️ Wind: {current['winddisplay']}\n\n"
-        )
-        
-        # Add heat advisory
-        advisory, advice = WeatherService.get_heat_advisory(
-            current["temperature"], 
-            current["feelslike"]
-        )
-        weather_msg += f"⚠️ *{advisory}*\n{advice}\n\n"
-        
-        # Replace the table section in weather_location_handler with:
-        weather_msg += "🌤️ *5-Day Weather Forecast:*\n"
-        weather_msg += WeatherService.format_simple_forecast(forecasts)
+        weather_msg = WeatherService.format_weather_message(weather_data)
         
         # Create simplified keyboard options
         keyboard = [
@@ -356,9 +1562,9 @@ async def weather_location_handler(update: Update, context: CallbackContext) ->
             [InlineKeyboardButton("🔙 Main Menu", callback_data='back')]
         ]
         
-        await update.message.reply_text(
+        await reply_markdown(
+            update.message,
             weather_msg,
-            parse_mode="Markdown",
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
         return MAIN_MENU
@@ -369,7 +1575,7 @@ async def start(update: Update, context: CallbackContext) -> int:
     """Start command handler that works on all devices"""
     user = update.effective_user
     welcome_msg = (
-        f"🌍 Hello {user.first_name}! Welcome to *AeroBot* 🌱\n\n"
+        f"🌍 Hello {md_escape(user.first_name)}! Welcome to *AeroBot* 🌱\n\n"
         "I'm your climate and weather assistant. Here's what I can help with:\n"
         "• Real-time weather data and forecasts 🌦️\n"
         "• Climate change information and tips 🌱\n"
@@ -383,48 +1589,94 @@ async def start(update: Update, context: CallbackContext) -> int:
         context.chat_data.clear()
     
     # Always send a fresh message with main menu
-    await update.message.reply_text(
+    message = await reply_markdown(
+        update.message,
         welcome_msg,
-        parse_mode="Markdown",
         reply_markup=main_menu()
     )
+    if context.chat_data is not None:
+        # Menu navigation edits this message from here on
+        context.chat_data['menu_message_id'] = message.message_id
     return MAIN_MENU
 
+async def show_menu(query, context: CallbackContext, text: str, reply_markup: InlineKeyboardMarkup,
+                    markdown: bool = False) -> None:
+    """Show a navigation screen by editing the chat's menu message in place.
+
+    Only the latest menu message is edited, so content the user tapped a button
+    under (tips, guides) stays in the chat; in that case a new menu message is sent.
+    """
+    chat_data = context.chat_data
+    view = hash((text, str(reply_markup.to_dict())))
+    parse_mode = "Markdown" if markdown else None
+
+    if query.message and query.message.message_id == chat_data.get('menu_message_id'):
+        if chat_data.get('menu_view') == view:
+            return  # Nothing changed
+        try:
+            if chat_data.get('menu_text') == text:
+                await query.edit_message_reply_markup(reply_markup=reply_markup)
+            else:
+                await query.edit_message_text(text=text, parse_mode=parse_mode, reply_markup=reply_markup)
+            chat_data['menu_view'], chat_data['menu_text'] = view, text
+            return
+        except BadRequest as e:
+            if "not modified" in str(e):
+                chat_data['menu_view'], chat_data['menu_text'] = view, text
+                return
+            # Too old to edit or deleted: fall back to a new message
+            logger.info(f"Menu edit failed, sending a new menu: {str(e)}")
+
+    if markdown:
+        message = await send_markdown(context.bot, query.message.chat_id, text, reply_markup=reply_markup)
+    else:
+        message = await context.bot.send_message(
+            chat_id=query.message.chat_id, text=text, reply_markup=reply_markup
+        )
+    chat_data['menu_message_id'] = message.message_id
+    chat_data['menu_view'], chat_data['menu_text'] = view, text
+
 async def main_menu_handler(update: Update, context: CallbackContext) -> int:
-    """Handle main menu navigation - modified to preserve messages"""
+    """Handle main menu navigation - menus are edited in place, content is sent as new messages"""
+    deadline = Deadline(CONFIG["UPDATE_DEADLINE"])
     query = update.callback_query
     await query.answer()
+    prefetcher.observe(context.user_data, query.data)
     
     if query.data == 'back':
-        await context.bot.send_message(
-            chat_id=query.message.chat_id,
-            text="🌍 Main Menu 🌱\n\nSelect an option:",
-            reply_markup=main_menu()
+        await show_menu(
+            query,
+            context,
+            "🌍 Main Menu 🌱\n\nSelect an option:",
+            main_menu()
         )
         return MAIN_MENU
         
     elif query.data == 'weather':
-        await context.bot.send_message(
-            chat_id=query.message.chat_id,
-            text="🌇 Enter a city name for weather information:",
-            reply_markup=back_button()
+        await show_menu(
+            query,
+            context,
+            "🌇 Enter a city name for weather information:",
+            back_button()
         )
         return WEATHER_LOCATION
         
     elif query.data == 'ask':
-        await context.bot.send_message(
-            chat_id=query.message.chat_id,
-            text="🌡️ What climate-related question would you like to ask?",
-            reply_markup=back_button()
+        await show_menu(
+            query,
+            context,
+            "🌡️ What climate-related question would you like to ask?",
+            back_button()
         )
         return ASK_QUESTION
         
     elif query.data == 'tips':
         await show_typing(context, query.message.chat_id)
-        tips = await get_eco_tips()
-        await context.bot.send_message(
-            chat_id=query.message.chat_id,
-            text=tips,
+        tips = await get_eco_tips(deadline)
+        await send_markdown(
+            context.bot,
+            query.message.chat_id,
+            tips,
             reply_markup=InlineKeyboardMarkup([
                 [InlineKeyboardButton("🔄 More Tips", callback_data='tips')],
                 [InlineKeyboardButton("🏠 Main Menu", callback_data='back')]
@@ -433,19 +1685,21 @@ async def main_menu_handler(update: Update, context: CallbackContext) -> int:
         return MAIN_MENU
         
     elif query.data == 'events':
-        await context.bot.send_message(
-            chat_id=query.message.chat_id,
-            text="📍 Enter a city for local events or leave blank for global events:",
-            reply_markup=back_button()
+        await show_menu(
+            query,
+            context,
+            "📍 Enter a city for local events or leave blank for global events:",
+            back_button()
         )
         return EVENTS_LOCATION
         
     elif query.data == 'water':
         await show_typing(context, query.message.chat_id)
-        tips = await get_water_tips()
-        await context.bot.send_message(
-            chat_id=query.message.chat_id,
-            text=tips,
+        tips = await get_water_tips(deadline=deadline)
+        await send_markdown(
+            context.bot,
+            query.message.chat_id,
+            tips,
             reply_markup=InlineKeyboardMarkup([
                 [InlineKeyboardButton("🔄 More Water Tips", callback_data='water')],
                 [InlineKeyboardButton("🏠 Main Menu", callback_data='back')]
@@ -454,18 +1708,20 @@ async def main_menu_handler(update: Update, context: CallbackContext) -> int:
         return MAIN_MENU
         
     elif query.data == 'disaster':
-        await context.bot.send_message(
-            chat_id=query.message.chat_id,
-            text="⚠️ Select disaster type for preparedness info:",
-            reply_markup=disaster_menu()
+        await show_menu(
+            query,
+            context,
+            "⚠️ Select disaster type for preparedness info:",
+            disaster_menu()
         )
         return MAIN_MENU
         
     elif query.data == 'laws':
-        await context.bot.send_message(
-            chat_id=query.message.chat_id,
-            text="📜 Select a climate law to view details:",
-            reply_markup=laws_menu()
+        await show_menu(
+            query,
+            context,
+            "📜 Select a climate law to view details:",
+            laws_menu()
         )
         return MAIN_MENU
         
@@ -481,23 +1737,25 @@ async def main_menu_handler(update: Update, context: CallbackContext) -> int:
             "\n\nGroup 4 - Super Science\n"
             "\nDeveloped with ❤️ for the planet"
         )
-        await context.bot.send_message(
-            chat_id=query.message.chat_id,
-            text=about_msg,
-            parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup([
+        await show_menu(
+            query,
+            context,
+            about_msg,
+            InlineKeyboardMarkup([
                 [InlineKeyboardButton("🏠 Main Menu", callback_data='back')]
-            ])
+            ]),
+            markdown=True
         )
         return MAIN_MENU
         
     elif query.data.startswith('prep_'):
         disaster_type = query.data.split('_')[1]
         await show_typing(context, query.message.chat_id)
-        guide = await get_disaster_prep(disaster_type)
-        await context.bot.send_message(
-            chat_id=query.message.chat_id,
-            text=guide,
+        guide = await get_disaster_prep(disaster_type, deadline)
+        await send_markdown(
+            context.bot,
+            query.message.chat_id,
+            guide,
             reply_markup=InlineKeyboardMarkup([
                 [InlineKeyboardButton("⚠️ More Disaster Prep", callback_data='disaster')],
                 [InlineKeyboardButton("🏠 Main Menu", callback_data='back')]
@@ -513,16 +1771,17 @@ async def main_menu_handler(update: Update, context: CallbackContext) -> int:
             f"📄 *Implementing Rules:* {law['irr']}\n\n"
             f"💸 *Fine:* {law['penalty']}\n\n"
             f"🕒 *Imprisonment:* {law['imprisonment']}\n\n"
-            f"🔗 [Read the full law]({law['link']})"
+            f"🔗 {md_link('Read the full law', law['link'])}"
         )
-        await context.bot.send_message(
-            chat_id=query.message.chat_id,
-            text=msg,
-            parse_mode="Markdown",
-            reply_markup=InlineKeyboardMarkup([
+        await show_menu(
+            query,
+            context,
+            msg,
+            InlineKeyboardMarkup([
                 [InlineKeyboardButton("📜 More Laws", callback_data='laws')],
                 [InlineKeyboardButton("🏠 Main Menu", callback_data='back')]
-            ])
+            ]),
+            markdown=True
         )
         return MAIN_MENU
         
@@ -608,14 +1867,15 @@ async def tomorrow_forecast_handler(update: Update, context: CallbackContext) ->
     
     location = weather_data["location"]["name"]
     tomorrow = weather_data["forecast"][1]
+    title = f"Detailed Tomorrow's Forecast for {location}"
     
     forecast_msg = (
-        f"📅 *Detailed Tomorrow's Forecast for {location}*\n\n"
-        f"📅 Date: {tomorrow['date']} ({tomorrow['day']})\n"
-        f"⬆️ Maximum Temperature: {tomorrow['high']}°C\n"
-        f"⬇️ Minimum Temperature: {tomorrow['low']}°C\n"
-        f"🌧️ Precipitation Chance: {tomorrow['precip']}%\n"
-        f"☀️ Expected Conditions: {tomorrow['skytextday']}\n\n"
+        f"📅 {md_bold(title)}\n\n"
+        f"📅 Date: {md_escape(tomorrow['date'])} ({md_escape(tomorrow['day'])})\n"
+        f"⬆️ Maximum Temperature: {md_escape(tomorrow['high'])}°C\n"
+        f"⬇️ Minimum Temperature: {md_escape(tomorrow['low'])}°C\n"
+        f"🌧️ Precipitation Chance: {md_escape(tomorrow['precip'])}%\n"
+        f"☀️ Expected Conditions: {md_escape(tomorrow['skytextday'])}\n\n"
         f"🧭 Recommendations:\n"
         f"- {'🌂 Carry an umbrella' if int(tomorrow['precip']) > 30 else 'No rain expected'}\n"
         f"- {'🧴 Apply sunscreen' if 'sunny' in tomorrow['skytextday'].lower() else ''}\n"
@@ -656,13 +1916,14 @@ async def tomorrow_forecast_handler(update: Update, context: CallbackContext) ->
     
     location = weather_data["location"]["name"]
     tomorrow = weather_data["forecast"][1]
+    title = f"Tomorrow's Forecast for {location}"
     
     forecast_msg = (
-        f"📅 *Tomorrow's Forecast for {location}*\n\n"
-        f"⬆️ High: {tomorrow['high']}°C | ⬇️ Low: {tomorrow['low']}°C\n"
-        f"🌧️ Precipitation: {tomorrow['precip']}%\n"
-        f"☀️ Conditions: {tomorrow['skytextday']}\n\n"
-        f"📅 Date: {tomorrow['date']} ({tomorrow['day']})"
+        f"📅 {md_bold(title)}\n\n"
+        f"⬆️ High: {md_escape(tomorrow['high'])}°C | ⬇️ Low: {md_escape(tomorrow['low'])}°C\n"
+        f"🌧️ Precipitation: {md_escape(tomorrow['precip'])}%\n"
+        f"☀️ Conditions: {md_escape(tomorrow['skytextday'])}\n\n"
+        f"📅 Date: {md_escape(tomorrow['date'])} ({md_escape(tomorrow['day'])})"
     )
     
     keyboard = [
@@ -679,6 +1940,7 @@ async def tomorrow_forecast_handler(update: Update, context: CallbackContext) ->
 
 async def ask_question_handler(update: Update, context: CallbackContext) -> int:
     """Handle climate questions - modified to preserve messages"""
+    deadline = Deadline(CONFIG["UPDATE_DEADLINE"])
     if update.message:
         question = clean_input(update.message.text)
         
@@ -691,8 +1953,12 @@ async def ask_question_handler(update: Update, context: CallbackContext) -> int:
             
         await show_typing(context, update.message.chat_id, 2.0)
         
-        answer = await ask_ai(question)
-        await update.message.reply_text(
+        history = context.user_data.setdefault('ai_history', deque(maxlen=CONFIG["AI_HISTORY_TURNS"]))
+        answer = await ask_ai(question, deadline, list(history))
+        if not answer.startswith("⚠️"):
+            history.append((question, answer[:CONFIG["AI_HISTORY_ANSWER_CHARS"]]))
+        await reply_markdown(
+            update.message,
             answer,
             reply_markup=InlineKeyboardMarkup([
                 [InlineKeyboardButton("❓ Ask Another", callback_data='ask')],
@@ -705,6 +1971,7 @@ async def ask_question_handler(update: Update, context: CallbackContext) -> int:
 
 async def events_location_handler(update: Update, context: CallbackContext) -> int:
     """Handle events location input - modified to preserve messages"""
+    deadline = Deadline(CONFIG["UPDATE_DEADLINE"])
     if update.message:
         location = clean_input(update.message.text)
         
@@ -717,8 +1984,9 @@ async def events_location_handler(update: Update, context: CallbackContext) -> i
             
         await show_typing(context, update.message.chat_id, 2.0)
         
-        events = await get_climate_events(location if location else None)
-        await update.message.reply_text(
+        events = await get_climate_events(location if location else None, deadline)
+        await reply_markdown(
+            update.message,
             events,
             reply_markup=InlineKeyboardMarkup([
                 [InlineKeyboardButton("📅 More Events", callback_data='events')],
@@ -737,25 +2005,203 @@ async def cancel(update: Update, context: CallbackContext) -> int:
     )
     return ConversationHandler.END
 
+def weather_inline_result(weather_data: Dict[str, Any]) -> InlineQueryResultArticle:
+    """Build an inline result card for a city's weather"""
+    location = weather_data["location"]["name"]
+    current = weather_data["current"]
+    return InlineQueryResultArticle(
+        # Result IDs are limited to 64 bytes; a digest fits for any location name
+        id=hashlib.sha1(location.encode("utf-8")).hexdigest(),
+        title=f"🌤️ {location}: {current['temperature']}°C",
+        description=f"{current['skytext']} • Feels like {current['feelslike']}°C • 💧 {current['humidity']}%",
+        input_message_content=InputTextMessageContent(
+            WeatherService.format_weather_message(weather_data),
+            parse_mode="Markdown"
+        )
+    )
+
+async def inline_query_handler(update: Update, context: CallbackContext) -> None:
+    """Answer inline weather lookups (@bot city) from cache, debouncing upstream fetches"""
+    deadline = Deadline(CONFIG["UPDATE_DEADLINE"])
+    query = update.inline_query
+    city = clean_input(query.query)
+
+    if len(city) < CONFIG["INLINE_MIN_QUERY"] or not validate_city_name(city):
+        await query.answer([], cache_time=CONFIG["INLINE_EMPTY_CACHE_TIME"])
+        return
+
+    # Exact or prefix matches from cache are answered straight away
+    weather_data = WeatherService.get_cached_weather(city)
+    if not weather_data:
+        stale = WeatherService.get_cached_weather(city, allow_stale=True)
+        if stale:
+            # Answer from the expired entry now and refresh it for the next lookup
+            refresh_key = f"inline:{WeatherService.cache_key(city)}"
+            if refresh_key not in _inline_refreshing:
+                _inline_refreshing.add(refresh_key)
+                task = spawn_background(WeatherService.get_weather_data(city, deadline, refresh=True))
+                task.add_done_callback(lambda _: _inline_refreshing.discard(refresh_key))
+            await query.answer(
+                [weather_inline_result(dict(stale, stale=True))],
+                cache_time=CONFIG["INLINE_EMPTY_CACHE_TIME"]
+            )
+            return
+    if weather_data:
+        matches = [weather_data]
+    else:
+        matches = WeatherService.find_cached_cities(city, CONFIG["INLINE_MAX_RESULTS"])
+    if matches:
+        # Different cache keys can resolve to the same place; Telegram rejects duplicate IDs
+        unique: Dict[str, Dict[str, Any]] = {}
+        for data in matches:
+            unique.setdefault(data["location"]["name"], data)
+        await query.answer(
+            [weather_inline_result(data) for data in unique.values()],
+            cache_time=CONFIG["INLINE_CACHE_TIME"]
+        )
+        return
+
+    # Telegram sends a query per keystroke; only fetch once the user stops typing
+    context.user_data['inline_query_id'] = query.id
+    await asyncio.sleep(CONFIG["INLINE_DEBOUNCE"])
+    if context.user_data.get('inline_query_id') != query.id:
+        return
+
+    weather_data = await WeatherService.get_weather_data(city, deadline)
+    if not weather_data or weather_data.get("stale"):
+        # Telegram caches answers per query text for everyone; keep failures short-lived
+        results = [weather_inline_result(weather_data)] if weather_data else []
+        await query.answer(results, cache_time=CONFIG["INLINE_EMPTY_CACHE_TIME"])
+        return
+    await query.answer([weather_inline_result(weather_data)], cache_time=CONFIG["INLINE_CACHE_TIME"])
+
+async def warm_weather_cache(cities: List[str]) -> None:
+    """Keep weather for common cities fresh so inline lookups always hit the cache"""
+    while True:
+        for city in cities:
+            await WeatherService.get_weather_data(city, refresh=True)
+        await asyncio.sleep(CONFIG["INLINE_WARM_INTERVAL"])
+
+async def post_init(application: Application) -> None:
+    """Start background work once the bot is initialized"""
+    global _weather_warmer
+    await asyncio.to_thread(load_cache_snapshot, CONFIG["CACHE_SNAPSHOT_PATH"])
+    logger.info(f"Ready to poll {time.perf_counter() - _IMPORT_STARTED:.3f}s after import started")
+    _weather_warmer = asyncio.create_task(warm_weather_cache(CONFIG["INLINE_WARM_CITIES"]))
+    http_cache_maintainer.start()
+    loop_watchdog.start()
+    data_sweeper.start(application)
+
+async def post_stop(application: Application) -> None:
+    """Let background backend calls finish once updates are drained"""
+    await http_cache_maintainer.stop()
+    await loop_watchdog.stop()
+    await data_sweeper.stop()
+    if _weather_warmer is not None:
+        _weather_warmer.cancel()
+        await asyncio.gather(_weather_warmer, return_exceptions=True)
+    await drain_background(CONFIG["SHUTDOWN_GRACE"])
+
+async def post_shutdown(application: Application) -> None:
+    """Persist caches for the next start"""
+    try:
+        await asyncio.to_thread(save_cache_snapshot, CONFIG["CACHE_SNAPSHOT_PATH"])
+    except OSError as e:
+        logger.error(f"Could not save cache snapshot: {str(e)}")
+
+async def stats_command(update: Update, context: CallbackContext) -> None:
+    """Admin command: show cache sizes and maintenance metrics"""
+    if not is_admin(update.effective_user.id):
+        return
+
+    lines = ["📊 AeroBot Stats", ""]
+    for name, cache in _caches.items():
+        lines.append(f"{name} cache: {len(cache)} entries")
+    lines.append("")
+    lines.append("HTTP cache:")
+    for metric, value in http_cache_maintainer.metrics.items():
+        lines.append(f"• {metric}: {value}")
+    lines.append("")
+    lines.append("Prefetch:")
+    for metric, value in prefetcher.metrics.items():
+        lines.append(f"• {metric}: {value}")
+    lines.append("")
+    lines.append("Event loop:")
+    for metric, value in loop_watchdog.metrics.items():
+        lines.append(f"• {metric}: {value}")
+    lines.append("")
+    lines.append(f"Weather providers (hedged requests: {WeatherService.hedges}):")
+    for provider in WeatherService.providers:
+        stats = ", ".join(f"{metric} {value}" for metric, value in provider.stats().items())
+        lines.append(f"• {provider.name}: {stats}")
+    lines.append("")
+    lines.append("User data:")
+    for metric, value in data_sweeper.metrics.items():
+        lines.append(f"• {metric}: {value}")
+    for category, size in data_sweeper.memory.items():
+        lines.append(f"• {category}: ~{size / 1024:.1f} KiB")
+    await update.message.reply_text("\n".join(lines))
+
+async def profile_command(update: Update, context: CallbackContext) -> None:
+    """Admin command: /profile [seconds] samples the running bot and sends a folded-stack file"""
+    if not is_admin(update.effective_user.id):
+        return
+
+    try:
+        seconds = float(context.args[0]) if context.args else 10.0
+    except ValueError:
+        await update.message.reply_text("Usage: /profile [seconds]")
+        return
+    seconds = min(max(seconds, 1.0), CONFIG["PROFILE_MAX_SECONDS"])
+
+    await update.message.reply_text(f"⏱️ Profiling for {seconds:.0f}s...")
+    path = Path(CONFIG["PROFILE_DIR"]) / f"aerobot-{os.getpid()}-{datetime.now():%Y%m%d-%H%M%S}.folded"
+    samples = await asyncio.to_thread(sample_profile, seconds, CONFIG["PROFILE_SAMPLE_INTERVAL"], path)
+    logger.info(f"Wrote {samples} profile samples to {path}")
+    await update.message.reply_document(
+        document=path,
+        caption=f"{samples} samples over {seconds:.0f}s (folded stacks for flamegraph.pl or speedscope)"
+    )
+
 # AI-based functions
-async def get_eco_tips() -> str:
+async def get_eco_tips(deadline: Optional[Deadline] = None) -> str:
     """Get eco tips from AI"""
     return "🌿 *Eco Tips* 🌿\n\n" + await AIService.fetch_ai_response(
         prompt="Provide 5 practical eco-friendly tips with emojis maximum 200 words",
         system_message="You're an environmental expert. Provide actionable eco tips, maximum 200 words.",
-        max_tokens=1000
+        max_tokens=1000,
+        deadline=deadline
     )
 
-async def ask_ai(question: str) -> str:
+async def ask_ai(
+    question: str,
+    deadline: Optional[Deadline] = None,
+    history: Optional[Sequence[Tuple[str, str]]] = None
+) -> str:
     """Get answer to climate question from AI"""
     return await AIService.fetch_ai_response(
         prompt=question,
         system_message="You're a climate scientist. Provide accurate, concise answers to climate questions, maximum 200 words.",
-        max_tokens=1500
+        max_tokens=1500,
+        cache=True,
+        deadline=deadline,
+        history=history
     )
 
-async def get_climate_events(city: Optional[str] = None) -> str:
+_news_cache = make_cache("news", CONFIG["NEWS_CACHE_EXPIRE"])
+
+def _fetch_json(url: str, timeout: float) -> Dict[str, Any]:
+    """Blocking GET returning decoded JSON, meant to run in a worker thread"""
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+async def get_climate_events(city: Optional[str] = None, deadline: Optional[Deadline] = None) -> str:
     """Get climate-related news events from GNews API using urllib"""
+    cache_key = (city or "").lower()
+    cached = _news_cache.get(cache_key)
+    if cached:
+        return cached
+
     try:
         # Get API key from environment variables
         api_key = os.getenv("GNEWS_API_KEY") or "ebd3c240d560cee99713aac96e690a32"
@@ -770,44 +2216,47 @@ async def get_climate_events(city: Optional[str] = None) -> str:
         url = f"{base_url}?q={urllib.parse.quote(query)}&lang=en&max=3&apikey={api_key}"
         
         # Make the API request
-        with urllib.request.urlopen(url) as response:
-            data = json.loads(response.read().decode("utf-8"))
-            articles = data.get("articles", [])
-            
-            if not articles:
-                return "🌍 No climate news found currently. Check back later for updates!"
-            
-            # Format the news articles
-            events_msg = "🌦️ *Climate News Updates*\n\n"
-            for article in articles[:3]:  # Limit to 3 articles
-                title = article.get('title', 'No title')
-                description = article.get('description', '')
-                source = article.get('source', {}).get('name', 'Unknown source')
-                published_at = article.get('publishedAt', '')
-                url = article.get('url', '#')
-                
-                # Format date if available
-                date_str = ""
-                if published_at:
-                    try:
-                        date_obj = datetime.strptime(published_at, "%Y-%m-%dT%H:%M:%SZ")
-                        date_str = date_obj.strftime("%b %d, %Y")
-                    except ValueError:
-                        date_str = published_at[:10]  # Just show YYYY-MM-DD if parsing fails
-                
-                events_msg += (
-                    f"📰 *{title}*\n"
-                    f"{description}\n"
-                    f"📡 Source: {source}\n"
-                )
-                if date_str:
-                    events_msg += f"📅 Date: {date_str}\n"
-                events_msg += f"🔗 [Read more]({url})\n\n"
+        data = await call_backend(_fetch_json, url, timeout=10, deadline=deadline)
+        articles = data.get("articles", [])
+        
+        if not articles:
+            return "🌍 No climate news found currently. Check back later for updates!"
+        
+        # Format the news articles
+        events_msg = "🌦️ *Climate News Updates*\n\n"
+        for article in articles[:3]:  # Limit to 3 articles
+            title = article.get('title', 'No title')
+            description = article.get('description', '')
+            source = article.get('source', {}).get('name', 'Unknown source')
+            published_at = article.get('publishedAt', '')
+            url = article.get('url', '#')
             
-            return events_msg
+            # Format date if available
+            date_str = ""
+            if published_at:
+                try:
+                    date_obj = datetime.strptime(published_at, "%Y-%m-%dT%H:%M:%SZ")
+                    date_str = date_obj.strftime("%b %d, %Y")
+                except ValueError:
+                    date_str = published_at[:10]  # Just show YYYY-MM-DD if parsing fails
             
-    except urllib.error.URLError as e:
-        logger.error(f"GNews API request failed: {str(e)}")
+            events_msg += (
+                f"📰 {md_bold(title)}\n"
+                f"{md_escape(description or '')}\n"
+                f"📡 Source: {md_escape(source)}\n"
+            )
+            if date_str:
+                events_msg += f"📅 Date: {md_escape(date_str)}\n"
+            events_msg += f"🔗 {md_link('Read more', url)}\n\n"
+        
+        _news_cache.set(cache_key, events_msg)
+        return events_msg
+        
+    except (urllib.error.URLError, TimeoutError) as e:
+        logger.error(f"GNews API request failed: {str(e) or type(e).__name__}")
+        stale = _news_cache.get(cache_key, allow_stale=True)
+        if stale:
+            return stale
         return "⚠️ Could not fetch climate news. Please try again later."
     except json.JSONDecodeError as e:
         logger.error(f"Error decoding API response: {str(e)}")
@@ -816,23 +2265,125 @@ async def get_climate_events(city: Optional[str] = None) -> str:
         logger.error(f"Error processing climate news: {str(e)}")
         return "⚠️ An error occurred while fetching climate news."
 
-async def get_water_tips(region: Optional[str] = None) -> str:
+async def get_water_tips(region: Optional[str] = None, deadline: Optional[Deadline] = None) -> str:
     """Get water saving tips from AI"""
     prompt = f"Provide 5 water conservation tips for {region}." if region else "Provide 5 general water conservation tips, maximum 200 words."
     return "💧 *Water-Saving Tips* 💧\n\n" + await AIService.fetch_ai_response(
         prompt=prompt,
         system_message="You're a water conservation expert. Provide practical tips with emojis, maximum 200 words.",
-        max_tokens=1000
+        max_tokens=1000,
+        deadline=deadline
     )
 
-async def get_disaster_prep(disaster_type: str) -> str:
+def disaster_prep_request(disaster_type: str) -> Dict[str, Any]:
+    """AI request parameters for a disaster preparedness guide"""
+    return {
+        "prompt": f"Provide a 5-step preparedness guide for {disaster_type}, maximum 200 words.",
+        "system_message": "You're a disaster preparedness expert. Provide clear, actionable steps with emojis, maximum 200 words.",
+        "max_tokens": 1200,
+    }
+
+async def get_disaster_prep(disaster_type: str, deadline: Optional[Deadline] = None) -> str:
     """Get disaster preparedness guide from AI"""
     return f"⚠️ *{disaster_type.capitalize()} Preparedness* ⚠️\n\n" + await AIService.fetch_ai_response(
-        prompt=f"Provide a 5-step preparedness guide for {disaster_type}, maximum 200 words.",
-        system_message="You're a disaster preparedness expert. Provide clear, actionable steps with emojis, maximum 200 words.",
-        max_tokens=1200
+        **disaster_prep_request(disaster_type),
+        cache=True,
+        deadline=deadline
     )
 
+# Speculative prefetching
+class Prefetcher:
+    """Learns menu transitions and warms the most likely next backend result in the background"""
+
+    LOOKAHEAD = 2  # menu steps to look ahead
+
+    def __init__(self, max_concurrent: int, per_minute: int):
+        self.per_minute = per_minute
+        self.transitions: Dict[str, Counter] = defaultdict(Counter)
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self._window_start = 0.0
+        self._window_calls = 0
+        self._pending: set = set()
+        self.metrics = {"scheduled": 0, "already_cached": 0, "over_budget": 0, "failed": 0}
+
+    def observe(self, user_data: Dict[str, Any], action: str) -> None:
+        """Record a menu transition and prefetch what is likely to follow it"""
+        previous = user_data.get('last_action')
+        if previous:
+            self.transitions[previous][action] += 1
+        user_data['last_action'] = action
+
+        step = action
+        for _ in range(self.LOOKAHEAD):
+            likely = self.transitions.get(step)
+            if not likely:
+                break
+            step = likely.most_common(1)[0][0]
+            self._prefetch(step, user_data)
+        # The weather prompt is always followed by a city, usually the previous one
+        if action == 'weather':
+            self._prefetch('weather_city', user_data)
+
+    def _prefetch(self, action: str, user_data: Dict[str, Any]) -> None:
+        if action == 'weather_city' and user_data.get('last_city'):
+            city = user_data['last_city']
+            if WeatherService.get_cached_weather(city):
+                self.metrics["already_cached"] += 1
+                return
+            self._schedule(f"weather:{city.lower()}", WeatherService.get_weather_data, city)
+        elif action == 'disaster':
+            # Warm the guides most often picked from the disaster menu, other than the
+            # one just read, which is cached already
+            current = user_data.get('last_action')
+            siblings = [
+                guide for guide, _ in self.transitions.get('disaster', Counter()).most_common()
+                if guide.startswith('prep_') and guide != current
+            ]
+            for guide in siblings[:CONFIG["PREFETCH_SIBLINGS"]]:
+                self._prefetch(guide, user_data)
+        elif action.startswith('prep_'):
+            disaster_type = action.split('_')[1]
+            if AIService.is_cached(**disaster_prep_request(disaster_type)):
+                self.metrics["already_cached"] += 1
+                return
+            self._schedule(f"prep:{disaster_type}", get_disaster_prep, disaster_type)
+
+    def _take_budget(self) -> bool:
+        """Global rate limit so prefetching cannot overload upstream services"""
+        now = time.monotonic()
+        if now - self._window_start >= 60:
+            self._window_start, self._window_calls = now, 0
+        if self._window_calls >= self.per_minute or self._slots.locked():
+            return False
+        self._window_calls += 1
+        return True
+
+    def _schedule(self, key: str, fetch, *args) -> None:
+        if key in self._pending:
+            return
+        if not self._take_budget():
+            self.metrics["over_budget"] += 1
+            return
+        self._pending.add(key)
+        self.metrics["scheduled"] += 1
+        spawn_background(self._run(key, fetch, *args))
+
+    async def _run(self, key: str, fetch, *args) -> None:
+        try:
+            async with self._slots:
+                await fetch(*args, deadline=Deadline(CONFIG["PREFETCH_DEADLINE"]))
+        except Exception as e:
+            self.metrics["failed"] += 1
+            logger.warning(f"Prefetch of {key} failed: {str(e)}")
+        finally:
+            self._pending.discard(key)
+
+# Each worker process has its own prefetcher, so the upstream budget is split between them
+prefetcher = Prefetcher(
+    CONFIG["PREFETCH_MAX_CONCURRENT"],
+    max(1, CONFIG["PREFETCH_PER_MINUTE"] // CONFIG["WORKERS"])
+)
+
 # Philippine Environmental Laws
 PH_LAWS = {
     'law_waste': {
@@ -901,10 +2452,22 @@ PH_LAWS = {
     }
 }
 
-# Main function
-def main() -> None:
-    """Run the bot."""
-    application = Application.builder().token(CONFIG["TELEGRAM_TOKEN"]).build()
+# Application setup
+def build_application(with_updater: bool = True) -> Application:
+    """Build the bot application and register all handlers"""
+    builder = (
+        Application.builder()
+        .token(CONFIG["TELEGRAM_TOKEN"])
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+    )
+    if not with_updater:
+        builder = builder.updater(None)
+    application = builder.build()
+
+    # Record user/chat activity before any other handler runs
+    application.add_handler(TypeHandler(Update, data_sweeper.touch), group=-1)
 
     # Add conversation handler with the states
     conv_handler = ConversationHandler(
@@ -929,9 +2492,157 @@ def main() -> None:
     )
 
     application.add_handler(conv_handler)
+    application.add_handler(CommandHandler("stats", stats_command))
+    # Non-blocking so the bot keeps serving updates while it is being profiled
+    application.add_handler(CommandHandler("profile", profile_command, block=False))
+
+    # Inline weather lookups; non-blocking so debounce waits don't stall other updates
+    application.add_handler(InlineQueryHandler(inline_query_handler, block=False))
     
     # Log all errors
     application.add_error_handler(error_handler)
+    return application
+
+# Multi-process deployment
+def update_partition_key(payload: Dict[str, Any]) -> int:
+    """Pick the chat id (or user id) an update belongs to, so one chat always hits one worker"""
+    for field in ("message", "edited_message", "channel_post", "edited_channel_post",
+                  "callback_query", "my_chat_member", "chat_member", "chat_join_request"):
+        item = payload.get(field)
+        if not item:
+            continue
+        chat = item.get("chat") or (item.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        if "from" in item:
+            return item["from"]["id"]
+    for field in ("inline_query", "chosen_inline_result", "shipping_query", "pre_checkout_query"):
+        item = payload.get(field)
+        if item and "from" in item:
+            return item["from"]["id"]
+    return payload.get("update_id", 0)
+
+class WebhookReceiver(BaseHTTPRequestHandler):
+    """Accept Telegram webhook posts and hand them to the worker owning the chat"""
+
+    def do_POST(self) -> None:
+        secret = CONFIG["WEBHOOK_SECRET"]
+        if secret and self.headers.get("X-Telegram-Bot-Api-Secret-Token") != secret:
+            self.send_response(403)
+            self.end_headers()
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length))
+        except ValueError:
+            self.send_response(400)
+            self.end_headers()
+            return
+
+        queues = self.server.worker_queues
+        queues[update_partition_key(payload) % len(queues)].put(payload)
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug("Webhook receiver: " + format, *args)
+
+async def _run_worker(index: int, update_queue) -> None:
+    """Feed updates from the receiver into an application without its own updater"""
+    application = build_application(with_updater=False)
+    async with application:
+        if index == 0:
+            # Caches are shared, so one worker is enough to warm them
+            await post_init(application)
+        await application.start()
+        loop_watchdog.start()
+        data_sweeper.start(application)
+        logger.info(f"Worker {index} started (pid {os.getpid()})")
+        receiver_pid = os.getppid()
+        try:
+            while True:
+                try:
+                    payload = await asyncio.to_thread(update_queue.get, timeout=1)
+                except queue.Empty:
+                    # Signals are ignored, so stop by ourselves if the receiver died
+                    if os.getppid() != receiver_pid:
+                        logger.warning(f"Worker {index}: receiver is gone, stopping")
+                        break
+                    continue
+                if payload is None:
+                    break
+                await application.update_queue.put(Update.de_json(payload, application.bot))
+        finally:
+            # Pending updates and handlers are drained by stop()
+            await application.stop()
+            await post_stop(application)
+        logger.info(f"Worker {index} stopped")
+
+def run_worker(index: int, update_queue) -> None:
+    """Worker process entry point"""
+    # Ctrl-C and a service manager's SIGTERM reach the whole process group;
+    # the receiver stops workers in order with a stop marker instead
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    asyncio.run(_run_worker(index, update_queue))
+
+def _raise_keyboard_interrupt(signum, frame) -> None:
+    raise KeyboardInterrupt
+
+async def _set_webhook() -> None:
+    async with Bot(CONFIG["TELEGRAM_TOKEN"]) as bot:
+        await bot.set_webhook(
+            url=CONFIG["WEBHOOK_URL"],
+            secret_token=CONFIG["WEBHOOK_SECRET"],
+            allowed_updates=Update.ALL_TYPES
+        )
+
+def run_cluster(workers: int) -> None:
+    """Run a webhook receiver that partitions updates by chat across worker processes.
+
+    Telegram requires HTTPS, so WEBHOOK_URL is expected to point at a TLS-terminating
+    proxy forwarding to WEBHOOK_LISTEN:WEBHOOK_PORT.
+    """
+    if not CONFIG["WEBHOOK_URL"]:
+        raise SystemExit("WEBHOOK_URL must be set to run with more than one worker")
+
+    queues = [multiprocessing.Queue() for _ in range(workers)]
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(index, worker_queue), name=f"aerobot-worker-{index}")
+        for index, worker_queue in enumerate(queues)
+    ]
+    for process in processes:
+        process.start()
+
+    asyncio.run(_set_webhook())
+
+    # Single-threaded on purpose: updates are queued in the order they arrive
+    server = HTTPServer((CONFIG["WEBHOOK_LISTEN"], CONFIG["WEBHOOK_PORT"]), WebhookReceiver)
+    server.worker_queues = queues
+    signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+    logger.info(f"Webhook receiver listening on port {CONFIG['WEBHOOK_PORT']} with {workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        # Workers finish every update already queued before seeing the stop marker
+        for worker_queue in queues:
+            worker_queue.put(None)
+        for process in processes:
+            process.join()
+        logger.info("All workers stopped")
+
+# Main function
+def main() -> None:
+    """Run the bot."""
+    if CONFIG["WORKERS"] > 1:
+        run_cluster(CONFIG["WORKERS"])
+        return
+
+    application = build_application()
 
     # Run the bot until the user presses Ctrl-C
     logger.info("Bot is running...")
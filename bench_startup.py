@@ -0,0 +1,72 @@
+"""Startup benchmark for AeroBot.
+
+Runs app.py in fresh interpreters and reports how long it takes to import the
+module and build the application, i.e. everything before the first getUpdates
+poll except the network round-trip of Bot.initialize(). The live
+import-to-first-poll time is logged by post_init on every start.
+
+Usage:
+    python bench_startup.py [--runs 10]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+HEAVY_MODULES = ["openmeteo_requests", "requests_cache", "numpy"]
+
+CHILD_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.build_application()
+built = time.perf_counter()
+print(json.dumps({
+    "import": imported - started,
+    "build": built - imported,
+    "total": built - started,
+    "heavy_loaded": [name for name in %r if name in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+def run_once(workdir: str) -> dict:
+    """Measure one cold start in a fresh interpreter"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = APP_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    env.setdefault("TELEGRAM_TOKEN", "123456:benchmark")
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT],
+        cwd=workdir,  # keep aerobot.log and cache files out of the repo
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure AeroBot cold-start time")
+    parser.add_argument("--runs", type=int, default=10, help="number of cold starts to measure")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        run_once(workdir)  # warm the filesystem and bytecode caches
+        samples = [run_once(workdir) for _ in range(args.runs)]
+
+    for phase in ("import", "build", "total"):
+        values = sorted(sample[phase] * 1000 for sample in samples)
+        print(
+            f"{phase:>7}: median {statistics.median(values):7.1f} ms | "
+            f"min {values[0]:7.1f} ms | max {values[-1]:7.1f} ms"
+        )
+    heavy = sorted({name for sample in samples for name in sample["heavy_loaded"]})
+    print(f"heavy modules loaded at startup: {', '.join(heavy) if heavy else 'none'}")
+
+if __name__ == "__main__":
+    main()